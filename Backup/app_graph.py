@@ -1,5 +1,6 @@
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import streamlit as st
 from graph_agent import crew
@@ -80,6 +81,8 @@ if st.session_state.watchlist:
         st.session_state.watchlist.remove(remove_stock)
         st.success(f"🗑️ {remove_stock} removed from watchlist.")
 
+MAX_FETCH_WORKERS = 16
+
 # Function to fetch live stock data
 def fetch_stock_details(symbol):
     try:
@@ -105,22 +108,25 @@ def fetch_stock_details(symbol):
             "P/B Ratio": "N/A",
         }
 
-# Display watchlist table if there are stocks
-if st.session_state.watchlist:
-    st.subheader("📊 Live Prices")
-    with st.spinner("Fetching live prices..."):
-        data = [fetch_stock_details(sym) for sym in st.session_state.watchlist]
-        df = pd.DataFrame(data)
-
-        st.dataframe(df, use_container_width=True)
-
-    # Auto-refresh every 30 seconds
-    #st.caption("⏳ Auto-refreshing every 30 seconds...")
-    #st.experimental_rerun()
-    from streamlit_autorefresh import st_autorefresh
-
-    # Auto-refresh every 30 seconds
-    st.caption("⏳ Auto-refreshing every 30 seconds...")
-    st_autorefresh(interval=30 * 1000, key="datarefresh")
-else:
-    st.info("⚠️ No stocks in your watchlist yet. Add one above to get started!")
+# Fetch all symbols concurrently (network bound)
+def fetch_watchlist_details(symbols):
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as executor:
+        return list(executor.map(fetch_stock_details, symbols))
+
+# Display watchlist table if there are stocks.
+# Only this fragment reruns on the 30s timer, not the whole page.
+@st.fragment(run_every=30)
+def watchlist_panel():
+    if st.session_state.watchlist:
+        st.subheader("📊 Live Prices")
+        with st.spinner("Fetching live prices..."):
+            data = fetch_watchlist_details(st.session_state.watchlist)
+            df = pd.DataFrame(data)
+
+            st.dataframe(df, use_container_width=True)
+
+        st.caption("⏳ Auto-refreshing every 30 seconds...")
+    else:
+        st.info("⚠️ No stocks in your watchlist yet. Add one above to get started!")
+
+watchlist_panel()
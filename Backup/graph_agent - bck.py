@@ -1,8 +1,11 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import yfinance as yf
+import pandas as pd
 from typing import TypedDict, List
 
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
 
@@ -22,6 +25,14 @@ llm = ChatGoogleGenerativeAI(
     temperature=0
 )
 
+answer_chain = ChatPromptTemplate.from_template("""
+You are a financial assistant.
+User asked: {query}
+Stock data:
+{valuation}
+Give a simple clear answer.
+""") | llm
+
 # =============================
 # Define state structure
 # =============================
@@ -42,30 +53,36 @@ def planner_node(state: AgentState) -> AgentState:
 # =============================
 # Fetcher Node
 # =============================
+MAX_FETCH_WORKERS = 16
+
+def _fetch_one(item: tuple) -> tuple:
+    symbol, ticker = item
+
+    # last price
+    last_price = ticker.fast_info.get("last_price")
+
+    # fundamentals
+    info = ticker.info
+    fundamentals = {
+        "last_price": float(last_price) if last_price else None,
+        "market_cap": info.get("marketCap"),
+        "pe_ratio": info.get("trailingPE"),
+        "pb_ratio": info.get("priceToBook"),
+        "debt_to_equity": info.get("debtToEquity"),
+        "roe": info.get("returnOnEquity"),
+        "revenue_growth": info.get("revenueGrowth"),
+    }
+    return symbol, fundamentals
+
 def fetcher_node(state: AgentState) -> AgentState:
+    symbols = state["symbols"]
     data = {}
-    for symbol in state["symbols"]:
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period="5d")
-
-        # last price
-        last_price = None
-        if not hist.empty:
-            last_price = hist["Close"].iloc[-1]
-
-        # fundamentals
-        info = ticker.info
-        fundamentals = {
-            "last_price": float(last_price) if last_price else None,
-            "market_cap": info.get("marketCap"),
-            "pe_ratio": info.get("trailingPE"),
-            "pb_ratio": info.get("priceToBook"),
-            "debt_to_equity": info.get("debtToEquity"),
-            "roe": info.get("returnOnEquity"),
-            "revenue_growth": info.get("revenueGrowth"),
-        }
-
-        data[symbol] = fundamentals
+    if symbols:
+        # One Tickers wrapper so every symbol shares yfinance's session/connection pool,
+        # and threads to overlap the blocking requests
+        tickers = yf.Tickers(" ".join(symbols))
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as executor:
+            data = dict(executor.map(_fetch_one, tickers.tickers.items()))
 
     state["data"] = data
     print(f"[Fetcher] Data fetched for {list(data.keys())}")
@@ -74,20 +91,20 @@ def fetcher_node(state: AgentState) -> AgentState:
 # =============================
 # Valuation Node
 # =============================
+VALUATION_LABELS = {
+    "last_price": "Last Price",
+    "market_cap": "Market Cap",
+    "pe_ratio": "P/E Ratio",
+    "pb_ratio": "P/B Ratio",
+    "debt_to_equity": "Debt/Equity",
+    "roe": "ROE",
+    "revenue_growth": "Revenue Growth",
+}
+
 def valuation_node(state: AgentState) -> AgentState:
-    lines = []
-    for symbol, d in state["data"].items():
-        lines.append(f"""
-{symbol} Fundamentals:
-- Last Price: {d['last_price']}
-- Market Cap: {d['market_cap']}
-- P/E Ratio: {d['pe_ratio']}
-- P/B Ratio: {d['pb_ratio']}
-- Debt/Equity: {d['debt_to_equity']}
-- ROE: {d['roe']}
-- Revenue Growth: {d['revenue_growth']}
-""")
-    state["valuation"] = "\n".join(lines)
+    # One row per symbol, rendered as a single markdown table for the LLM
+    df = pd.DataFrame.from_dict(state["data"], orient="index").rename(columns=VALUATION_LABELS)
+    state["valuation"] = df.fillna("N/A").to_markdown()
     print("[Valuation] Done")
     return state
 
@@ -95,14 +112,7 @@ def valuation_node(state: AgentState) -> AgentState:
 # Answer Node (Gemini LLM)
 # =============================
 def answer_node(state: AgentState) -> AgentState:
-    prompt = f"""
-You are a financial assistant.
-User asked: {state['query']}
-Stock data:
-{state['valuation']}
-Give a simple clear answer.
-"""
-    response = llm.invoke(prompt)
+    response = answer_chain.invoke({"query": state["query"], "valuation": state["valuation"]})
     state["answer"] = response.content
     print("[Answer] Done")
     return state
@@ -1,6 +1,11 @@
 import os
 import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
+import numpy as np
 import pandas as pd
 import streamlit as st
 from yahooquery import search
@@ -16,27 +21,77 @@ load_dotenv()
 # Persistent Watchlist Storage
 # ----------------------------
 WATCHLIST_FILE = "watchlist.json"
+SAVE_DEBOUNCE = 1.0  # minimum seconds between disk writes
 
-def load_watchlist() -> list[str]:
+@st.cache_resource
+def _watchlist_store() -> dict:
+    """Server-wide copy of the persisted watchlist; the file is read only once."""
+    watchlist = []
     if os.path.exists(WATCHLIST_FILE):
         try:
             with open(WATCHLIST_FILE, "r") as f:
-                data = json.load(f)
+                data = json.loads(f.read())
                 if isinstance(data, list):
-                    return data
+                    watchlist = data
         except Exception:
             pass
-    return []
+    return {
+        "watchlist": watchlist,          # latest list, possibly not yet on disk
+        "last_saved": list(watchlist),   # last list written successfully
+        "saved_at": float("-inf"),
+        "timer": None,
+        "lock": threading.Lock(),
+    }
+
+def load_watchlist() -> list[str]:
+    return list(_watchlist_store()["watchlist"])
+
+def _write_watchlist(watchlist: list[str]) -> None:
+    # Write-then-rename so a crash never leaves a truncated file behind
+    tmp_path = f"{WATCHLIST_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watchlist, f)
+    os.replace(tmp_path, WATCHLIST_FILE)
+
+def _save_now(store: dict) -> None:
+    # Caller holds the lock; last_saved only moves once os.replace has succeeded
+    pending = list(store["watchlist"])
+    store["saved_at"] = time.monotonic()
+    _write_watchlist(pending)
+    store["last_saved"] = pending
+
+def _flush_watchlist(store: dict) -> None:
+    with store["lock"]:
+        store["timer"] = None
+        try:
+            _save_now(store)
+        except Exception:
+            logging.getLogger(__name__).exception("Failed to save watchlist")
 
 def save_watchlist(watchlist: list[str]) -> None:
-    try:
-        with open(WATCHLIST_FILE, "w") as f:
-            json.dump(watchlist, f)
-    except Exception as e:
-        st.error(f"Failed to save watchlist: {e}")
+    store = _watchlist_store()
+    with store["lock"]:
+        store["watchlist"] = list(watchlist)
+        if watchlist == store["last_saved"] or store["timer"] is not None:
+            return  # already on disk, or the pending flush writes the latest list
+
+        wait = SAVE_DEBOUNCE - (time.monotonic() - store["saved_at"])
+        if wait > 0:
+            store["timer"] = threading.Timer(wait, _flush_watchlist, args=(store,))
+            store["timer"].start()
+            return
+
+        try:
+            _save_now(store)
+        except Exception as e:
+            st.error(f"Failed to save watchlist: {e}")
+
+def normalize_symbols(symbols: list[str]) -> list[str]:
+    """Strip, upper-case and de-duplicate symbols, keeping first-seen order."""
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
 
 if "watchlist" not in st.session_state:
-    st.session_state.watchlist = load_watchlist()
+    st.session_state.watchlist = normalize_symbols(load_watchlist())
 
 # ----------------------------
 # Symbol Search Helper (Yahooquery)
@@ -64,62 +119,165 @@ def search_symbol(query: str):
 # ----------------------------
 # Fetch Stock Data Row
 # ----------------------------
+MAX_FETCH_WORKERS = 16
+FETCH_CACHE_TTL = 30  # seconds; matches the watchlist refresh cadence
+VALUATION_CACHE_TTL = 3600  # P/E and P/B barely move intraday
+BAD_SYMBOL_TTL = 600  # seconds before an unpriceable symbol is retried
+WATCHLIST_COLUMNS = ["Symbol", "Current Price", "Change", "% Change", "P/E Ratio", "P/B Ratio"]
+
+@st.cache_resource(ttl=FETCH_CACHE_TTL, show_spinner=False)
+def get_ticker(symbol: str) -> yf.Ticker:
+    """Share one yf.Ticker per symbol across reruns (it memoizes its own responses)."""
+    return yf.Ticker(symbol)
+
+@st.cache_resource
+def _bad_symbols() -> dict:
+    """Symbols Yahoo could not price, mapped to when that was last seen."""
+    return {}
+
+@st.cache_resource
+def _unpriced_since() -> dict:
+    """Symbols the last fetch couldn't price, mapped to when that first happened."""
+    return {}
+
+def _record_unpriced(symbol: str) -> None:
+    # yfinance often turns request failures into an empty result, so one miss
+    # can't tell an unknown ticker from a flaky request. Only mark the symbol
+    # bad once a second, uncached fetch (after FETCH_CACHE_TTL) misses too.
+    now = time.time()
+    first_missed_at = _unpriced_since().setdefault(symbol, now)
+    if now - first_missed_at >= FETCH_CACHE_TTL:
+        _bad_symbols()[symbol] = now
+        _unpriced_since().pop(symbol, None)
+
+def is_bad_symbol(symbol: str) -> bool:
+    failed_at = _bad_symbols().get(symbol)
+    return failed_at is not None and time.time() - failed_at < BAD_SYMBOL_TTL
+
+@st.cache_data(ttl=FETCH_CACHE_TTL, show_spinner=False)
 def fetch_stock_row(symbol: str) -> dict:
-    row = {
-        "Symbol": symbol,
-        "Current Price": "N/A",
-        "Change": "N/A",
-        "% Change": "N/A",
-        "P/E Ratio": "N/A",
-        "P/B Ratio": "N/A",
-    }
+    """Live price from ``fast_info`` for tickers missing from the batched download.
+
+    ``Missing`` means no price came back without an exception being raised. That
+    covers unknown symbols, but also request failures yfinance logs and swallows,
+    so callers should not treat a single miss as proof the symbol is invalid.
+    """
+    row = {"Symbol": symbol, "Current Price": None, "Previous Close": None, "Missing": False}
 
     try:
-        ticker = yf.Ticker(symbol)
+        fi = get_ticker(symbol).fast_info
+        row["Current Price"] = fi.get("last_price") or fi.get("last_close")
+        row["Previous Close"] = fi.get("previous_close") or None
+    except Exception:
+        return row
 
-        # --- Price ---
-        price = None
-        prev_close = None
-        try:
-            fi = getattr(ticker, "fast_info", None)
-            if fi:
-                price = fi.get("last_price") or fi.get("last_close")
-                prev_close = fi.get("previous_close")
-        except Exception:
-            pass
+    row["Missing"] = row["Current Price"] is None
+    return row
+
+@st.cache_data(ttl=VALUATION_CACHE_TTL, show_spinner=False)
+def fetch_valuation(symbol: str) -> dict:
+    """P/E and P/B need the slow ``.info`` scrape, so keep them off the live refresh path.
+
+    Errors propagate so that st.cache_data doesn't keep a failed lookup for the full TTL.
+    """
+    row = {"P/E Ratio": "N/A", "P/B Ratio": "N/A"}
+    info = get_ticker(symbol).info
+    pe = info.get("trailingPE")
+    pb = info.get("priceToBook")
+    if isinstance(pe, (int, float)):
+        row["P/E Ratio"] = f"{pe:.2f}"
+    if isinstance(pb, (int, float)):
+        row["P/B Ratio"] = f"{pb:.2f}"
+    return row
+
+def _valuation_or_na(symbol: str) -> dict:
+    # Uncached: a failed scrape shows N/A for this refresh only and is retried next time
+    try:
+        return fetch_valuation(symbol)
+    except Exception:
+        return {"P/E Ratio": "N/A", "P/B Ratio": "N/A"}
+
+def _format(values: np.ndarray, template: str) -> np.ndarray:
+    """Format a float column in one pass, rendering NaN as "N/A"."""
+    formatted = pd.Series(values).map(template.format).to_numpy()
+    return np.where(np.isnan(values), "N/A", formatted)
+
+def fetch_watchlist_batch(symbols: list[str]) -> pd.DataFrame:
+    """Build the watchlist table from one ``yf.download`` call (yfinance threads the per-ticker requests)."""
+    if not symbols:
+        return pd.DataFrame(columns=WATCHLIST_COLUMNS)
 
-        # Fallback to history if fast_info fails
-        if price is None or prev_close is None:
-            hist = ticker.history(period="5d", interval="1d")
-            if not hist.empty:
-                price = float(hist["Close"].iloc[-1])
-                if len(hist) > 1:
-                    prev_close = float(hist["Close"].iloc[-2])
-
-        if price is not None:
-            row["Current Price"] = f"{price:.2f}"
-        if price is not None and prev_close:
-            change = price - prev_close
-            pct = (change / prev_close) * 100 if prev_close else 0.0
-            row["Change"] = f"{change:+.2f}"
-            row["% Change"] = f"{pct:+.2f}%"
-
-        # --- Valuation ---
+    live = [sym for sym in symbols if not is_bad_symbol(sym)]
+
+    data = pd.DataFrame()
+    if live:
         try:
-            info = ticker.info
-            pe = info.get("trailingPE")
-            pb = info.get("priceToBook")
-            if isinstance(pe, (int, float)):
-                row["P/E Ratio"] = f"{pe:.2f}"
-            if isinstance(pb, (int, float)):
-                row["P/B Ratio"] = f"{pb:.2f}"
+            data = yf.download(
+                " ".join(live),
+                period="5d",
+                interval="1d",
+                group_by="ticker",
+                threads=True,
+                progress=False,
+            )
         except Exception:
             pass
 
-    except Exception:
-        pass
-
-    return row
+    if data.empty:
+        closes = pd.DataFrame(columns=live, dtype=float)
+    elif isinstance(data.columns, pd.MultiIndex):
+        closes = data.xs("Close", axis=1, level=1)
+    else:
+        closes = data[["Close"]].set_axis(live[:1], axis=1)
+
+    # Last and previous *valid* close per symbol (exchange holidays leave NaNs)
+    valid = closes.notna()
+    from_end = valid[::-1].cumsum()[::-1]
+    price = closes.where(valid & (from_end == 1)).max().reindex(symbols)
+    prev_close = closes.where(valid & (from_end == 2)).max().reindex(symbols)
+
+    missing = [sym for sym in live if pd.isna(price[sym])]
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(symbols))) as executor:
+        valuations = executor.map(_valuation_or_na, live)
+        for row in executor.map(fetch_stock_row, missing):
+            price[row["Symbol"]] = row["Current Price"]
+            prev_close[row["Symbol"]] = row["Previous Close"]
+            if row["Missing"]:
+                _record_unpriced(row["Symbol"])
+        for sym in price.index[price.notna()]:
+            _unpriced_since().pop(sym, None)
+        valuation = pd.DataFrame(list(valuations), index=live, columns=["P/E Ratio", "P/B Ratio"])
+        valuation = valuation.reindex(symbols).fillna("N/A").reset_index(drop=True)
+
+    price = price.to_numpy(dtype=float)
+    prev_close = prev_close.to_numpy(dtype=float)
+    change = np.subtract(price, prev_close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(prev_close > 0, change / prev_close * 100, np.nan)
+
+    df = pd.DataFrame({
+        "Symbol": symbols,
+        "Current Price": _format(price, "{:.2f}"),
+        "Change": _format(change, "{:+.2f}"),
+        "% Change": _format(pct, "{:+.2f}%"),
+    })
+    return pd.concat([df, valuation], axis=1)[WATCHLIST_COLUMNS]
+
+def color_change(col: pd.Series) -> np.ndarray:
+    # Sign from the first byte of each cell as uint8, no per-cell string methods
+    first = col.to_numpy().astype("S1").view(np.uint8)
+    return np.where(
+        first == ord("+"), "color: green;",
+        np.where(first == ord("-"), "color: red;", ""),
+    )
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def style_watchlist(df: pd.DataFrame) -> str:
+    """Styled table HTML, keyed on the frame's contents so unchanged data skips styling."""
+    # Cell text (symbols from search results / watchlist.json) goes into raw HTML, so escape it
+    styler = df.style.format(escape="html").apply(color_change, subset=["Change", "% Change"])
+    html = styler.hide(axis="index").to_html()
+    return f'<div style="max-height: 400px; overflow: auto;">{html}</div>'
 
 # ----------------------------
 # Streamlit Page Setup
@@ -135,10 +293,11 @@ tab1, tab2 = st.tabs(["🔍 Stock Analysis", "📊 Live Watchlist"])
 with tab1:
     st.subheader("🔍 On-Demand Analysis")
     query = st.text_input("Enter a company name or ticker symbol:", "")
+    commentary = st.checkbox("Include AI valuation commentary")
 
     if st.button("Run Analysis") and query:
         with st.spinner("Analyzing..."):
-            state = {"query": query}
+            state = {"query": query, "commentary": commentary}
             result = crew.invoke(state)
 
         st.success("✅ Analysis complete!")
@@ -155,10 +314,10 @@ with tab1:
         st.markdown("**📊 Analysis**")
         st.write(result.get("analysis", "N/A"))
 
-        chart_path = result.get("chart")
-        if chart_path and os.path.exists(chart_path):
+        closes = result.get("closes")
+        if closes is not None and not closes.empty:
             st.subheader("📉 1-Year Price Chart")
-            st.image(chart_path, use_container_width=True)
+            st.line_chart(closes, use_container_width=True)
         else:
             st.info("No chart generated.")
 
@@ -176,7 +335,7 @@ with tab2:
             if not matches:
                 st.error("❌ No matches found.")
             elif len(matches) == 1:
-                sym = matches[0]["symbol"]
+                sym = matches[0]["symbol"].strip().upper()
                 if sym not in st.session_state.watchlist:
                     st.session_state.watchlist.append(sym)
                     save_watchlist(st.session_state.watchlist)
@@ -196,7 +355,7 @@ with tab2:
             [f"{m['symbol']} - {m['name']} ({m['exchange']})" for m in st.session_state["matches"]],
         )
         if st.button("✅ Confirm Add"):
-            sym = selected.split(" - ")[0]
+            sym = selected.split(" - ")[0].strip().upper()
             if sym not in st.session_state.watchlist:
                 st.session_state.watchlist.append(sym)
                 save_watchlist(st.session_state.watchlist)
@@ -218,21 +377,8 @@ with tab2:
         if st.button("🔄 Refresh Prices Now"):
             st.rerun()
 
-        rows = [fetch_stock_row(sym) for sym in st.session_state.watchlist]
-        df = pd.DataFrame(rows, columns=["Symbol", "Current Price", "Change", "% Change", "P/E Ratio", "P/B Ratio"])
-
-        def color_change(val: str):
-            try:
-                if isinstance(val, str) and val not in ("N/A", ""):
-                    return "color: green;" if val.strip().startswith("+") else "color: red;"
-            except Exception:
-                pass
-            return ""
-
-        st.dataframe(
-            df.style.applymap(color_change, subset=["Change", "% Change"]),
-            use_container_width=True,
-            height=400,
-        )
+        df = fetch_watchlist_batch(st.session_state.watchlist)
+
+        st.markdown(style_watchlist(df), unsafe_allow_html=True)
     else:
         st.info("Your watchlist is empty. Add companies above to get started.")
@@ -1,12 +1,17 @@
 import os
+import re
+import httpx
 import yfinance as yf
-import matplotlib.pyplot as plt
 from dotenv import load_dotenv
+from functools import lru_cache
 from typing import TypedDict, Optional, Any
 
 from langgraph.graph import StateGraph, END
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from stock_tools import classify_valuation
+
 # --------------------------------------------------------
 # Load environment variables
 # --------------------------------------------------------
@@ -17,93 +22,154 @@ GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GEMINI_API_KEY:
     raise ValueError("❌ GOOGLE_API_KEY not found in .env file!")
 
-# Initialize Gemini LLM
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GEMINI_API_KEY)
+# Initialize Gemini LLM once; its pooled HTTP/2 client reuses kept-alive
+# connections across nodes instead of re-handshaking on every call
+llm = ChatGoogleGenerativeAI(
+    model="gemini-1.5-flash",
+    google_api_key=GEMINI_API_KEY,
+    client_args={"http2": True, "limits": httpx.Limits(max_keepalive_connections=10)},
+)
+
+# --------------------------------------------------------
+# Prompt chains (compiled once, only the variables change per call)
+# --------------------------------------------------------
+symbol_chain = ChatPromptTemplate.from_template(
+    "Extract the stock ticker symbol (Yahoo Finance format) for this query: '{query}'. Reply only with the ticker symbol."
+) | llm
+
+valuation_chain = ChatPromptTemplate.from_template(
+    "Stock {symbol} fundamentals: {fundamentals}. Provide a short valuation commentary."
+) | llm
+
+analysis_chain = ChatPromptTemplate.from_template("""
+    Analyze the stock {symbol} based on its last 1 year price trend and fundamentals.
+    The current stock price is {latest_price}.
+    Give a concise technical + fundamental outlook in 4-5 lines.
+    """) | llm
 
 # --------------------------------------------------------
 # Define State schema
 # --------------------------------------------------------
 class StockState(TypedDict, total=False):
     query: str
+    commentary: bool
     symbol: str
     data: Any
+    info: dict
     latest_price: Optional[float]
     valuation: str
     analysis: str
-    chart: Optional[str]
+    closes: Any
 
 # --------------------------------------------------------
 # Nodes
 # --------------------------------------------------------
 
+# Queries typed as a Yahoo ticker already (e.g. AAPL, INFY.NS) skip the LLM
+TICKER_PATTERN = re.compile(r"^[A-Z]{1,5}(\.[A-Z]{1,2})?$")
+
+
+@lru_cache(maxsize=1024)
+def _symbol_for(query: str) -> str:
+    """Ask Gemini for the ticker; cached since the mapping rarely changes"""
+    response = symbol_chain.invoke({"query": query})
+    return response.content.strip().upper()
+
+
 def auto_symbol_node(state: StockState):
     """Detect stock symbol from query using Gemini"""
-    query = state.get("query", "")
+    query = state.get("query", "").strip()
     if not query:
         return {"symbol": ""}
 
-    prompt = f"Extract the stock ticker symbol (Yahoo Finance format) for this query: '{query}'. Reply only with the ticker symbol."
-    response = llm.invoke(prompt)
-    symbol = response.content.strip().upper()
-    return {"symbol": symbol}
+    if TICKER_PATTERN.match(query):
+        return {"symbol": query}
+
+    return {"symbol": _symbol_for(query.lower())}
 
 
 def fetcher_node(state: StockState):
-    """Fetch stock data, latest price, and generate 1Y chart"""
+    """Fetch stock data, fundamentals, latest price, and 1Y closing prices"""
     symbol = state.get("symbol", "")
     if not symbol:
-        return {"data": None, "latest_price": None, "chart": None}
+        return {"data": None, "info": {}, "latest_price": None, "closes": None}
 
-    chart_path = None
     latest_price = None
+    closes = None
     hist = None
+    info = {}
 
     try:
         ticker = yf.Ticker(symbol)
         hist = ticker.history(period="1y")
 
+        # Fetched once here so downstream nodes don't hit Yahoo again
+        try:
+            info = ticker.info or {}
+        except Exception:
+            info = {}
+
         if not hist.empty:
             # Latest price = last Close
             latest_price = round(hist["Close"].iloc[-1], 2)
-
-            # Generate chart
-            chart_path = f"{symbol}_chart.png"
-            plt.figure(figsize=(10, 5))
-            plt.plot(hist.index, hist["Close"], label=f"{symbol} Close Price")
-            plt.title(f"{symbol} - 1 Year Price Chart")
-            plt.xlabel("Date")
-            plt.ylabel("Price")
-            plt.legend()
-            plt.grid(True)
-            plt.savefig(chart_path)
-            plt.close()
+            # Raw series for the UI to chart; no image rendering on this path
+            closes = hist["Close"]
     except Exception as e:
-        return {"data": None, "latest_price": None, "chart": None, "analysis": f"Error fetching data: {e}"}
+        return {"data": None, "info": {}, "latest_price": None, "closes": None, "analysis": f"Error fetching data: {e}"}
 
     return {
         "data": hist if hist is not None else None,
+        "info": info,
         "latest_price": latest_price,
-        "chart": chart_path
+        "closes": closes
     }
 
 
+def save_chart(symbol: str, closes) -> str:
+    """Render the 1Y closing prices to a PNG (only used outside the Streamlit UI)"""
+    # Imported lazily: matplotlib's import cost shouldn't land on every app start
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    chart_path = f"{symbol}_chart.png"
+    plt.figure(figsize=(10, 5))
+    plt.plot(closes.index, closes, label=f"{symbol} Close Price")
+    plt.title(f"{symbol} - 1 Year Price Chart")
+    plt.xlabel("Date")
+    plt.ylabel("Price")
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(chart_path)
+    plt.close()
+    return chart_path
+
+
 def valuation_node(state: StockState):
-    """Get valuation commentary using Gemini"""
+    """Classify valuation from P/E and P/B; Gemini commentary only on request"""
     symbol = state.get("symbol", "")
     if not symbol:
         return {"valuation": "No symbol available for valuation."}
 
-    try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
+    info = state.get("info") or {}
+    if not info:
+        return {"valuation": "Valuation data unavailable."}
 
+    try:
         pe = info.get("trailingPE")
         pb = info.get("priceToBook")
         roe = info.get("returnOnEquity")
 
+        # The ratio thresholds are deterministic, so only pay for an LLM
+        # round-trip when commentary was explicitly asked for
+        if not state.get("commentary"):
+            if not (isinstance(pe, (int, float)) and isinstance(pb, (int, float))):
+                return {"valuation": "Data not available"}
+            roe_text = f"{roe:.1%}" if isinstance(roe, (int, float)) else "N/A"
+            return {"valuation": f"{classify_valuation(pe, pb)} (P/E: {pe:.2f}, P/B: {pb:.2f}, ROE: {roe_text})"}
+
         fundamentals = f"P/E: {pe}, P/B: {pb}, ROE: {roe}"
-        prompt = f"Stock {symbol} fundamentals: {fundamentals}. Provide a short valuation commentary."
-        response = llm.invoke(prompt)
+        response = valuation_chain.invoke({"symbol": symbol, "fundamentals": fundamentals})
         return {"valuation": response.content}
     except Exception:
         return {"valuation": "Valuation data unavailable."}
@@ -118,12 +184,7 @@ def analysis_node(state: StockState):
         return {"analysis": "No data available for analysis."}
 
     latest_price = state.get("latest_price", "N/A")
-    prompt = f"""
-    Analyze the stock {symbol} based on its last 1 year price trend and fundamentals.
-    The current stock price is {latest_price}.
-    Give a concise technical + fundamental outlook in 4-5 lines.
-    """
-    response = llm.invoke(prompt)
+    response = analysis_chain.invoke({"symbol": symbol, "latest_price": latest_price})
 
     return {"analysis": response.content}
 
@@ -139,8 +200,11 @@ workflow.add_node("Analysis", analysis_node)
 
 workflow.set_entry_point("AutoSymbol")
 workflow.add_edge("AutoSymbol", "Fetcher")
+# Valuation and Analysis only read Fetcher output and write separate keys,
+# so fan out and let LangGraph run both LLM calls in the same step
 workflow.add_edge("Fetcher", "Valuation")
-workflow.add_edge("Valuation", "Analysis")
+workflow.add_edge("Fetcher", "Analysis")
+workflow.add_edge("Valuation", END)
 workflow.add_edge("Analysis", END)
 
 crew = workflow.compile()
@@ -158,4 +222,6 @@ if __name__ == "__main__":
     print("Latest Price:", result.get("latest_price"))
     print("Valuation:", result.get("valuation"))
     print("Analysis:", result.get("analysis"))
-    print("Chart saved at:", result.get("chart"))
+    closes = result.get("closes")
+    if closes is not None:
+        print("Chart saved at:", save_chart(result["symbol"], closes))
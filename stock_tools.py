@@ -1,3 +1,4 @@
+import numpy as np
 import yfinance as yf
 
 def get_fundamentals(symbol: str) -> dict:
@@ -14,23 +15,37 @@ def get_fundamentals(symbol: str) -> dict:
         "roa": info.get("returnOnAssets"),
     }
 
+def _tail_mean(values: np.ndarray, window: int) -> float:
+    # Last value of rolling(window).mean(): NaN until a full window exists
+    if len(values) < window:
+        return float("nan")
+    return values[-window:].mean()
+
 def get_technicals(symbol: str) -> dict:
     stock = yf.Ticker(symbol)
     hist = stock.history(period="6mo")
     if hist.empty:
         return {"error": "No data"}
 
-    ma50 = hist["Close"].rolling(50).mean().iloc[-1]
-    ma200 = hist["Close"].rolling(200).mean().iloc[-1]
+    closes = hist["Close"].to_numpy()
+    ma50 = _tail_mean(closes, 50)
+    ma200 = _tail_mean(closes, 200)
 
     return {
         "symbol": symbol,
-        "lastClose": hist["Close"].iloc[-1],
+        "lastClose": closes[-1],
         "ma50": round(ma50, 2),
         "ma200": round(ma200, 2),
         "trend": "Bullish" if ma50 > ma200 else "Bearish",
     }
 
+def classify_valuation(pe: float, pb: float) -> str:
+    if pe < 15 and pb < 1.5:
+        return "Undervalued"
+    if pe < 25 and pb < 3:
+        return "Fairly valued"
+    return "Overvalued"
+
 def get_valuation(symbol: str) -> dict:
     fundamentals = get_fundamentals(symbol)
     pe = fundamentals.get("peRatio")
@@ -39,16 +54,9 @@ def get_valuation(symbol: str) -> dict:
     if not pe or not pb:
         return {"symbol": symbol, "valuation": "Data not available"}
 
-    if pe < 15 and pb < 1.5:
-        status = "Undervalued"
-    elif pe < 25 and pb < 3:
-        status = "Fairly valued"
-    else:
-        status = "Overvalued"
-
     return {
         "symbol": symbol,
         "peRatio": pe,
         "pbRatio": pb,
-        "valuation": status,
+        "valuation": classify_valuation(pe, pb),
     }